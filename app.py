@@ -2,89 +2,308 @@ import streamlit as st
 import pandas as pd
 import joblib
 import numpy as np
-import json, os, textwrap
-from math import ceil
+import atexit, copy, json, os, textwrap, threading, time
 from streamlit_searchbox import st_searchbox
+try:
+    import orjson
+except ImportError:  # optional; the stdlib json module reads and writes the same files
+    orjson = None
 from datetime import datetime   # 👈 Added for greeting
 
 USER_DATA_FILE = "user_data.json"
+USER_LOG_FILE = "user_data.log"
+USER_LOG_MAX_BYTES = 64 * 1024
+USER_FLUSH_DELAY = 2.0  # seconds; watched clicks within this window share one snapshot write
 
 # ===== User Data Storage =====
-def load_user_data():
+# Bytes in, bytes out either way, so the files are opened in binary mode
+_json_loads = orjson.loads if orjson else json.loads
+
+def _json_dumps(obj):
+    return orjson.dumps(obj) if orjson else json.dumps(obj).encode()
+
+# The parsed user data lives in a process-wide cache. Watched clicks update the
+# cache and append to user_data.log; a short timer (or flush_user_data()) folds
+# everything back into the user_data.json snapshot. Several processes (app.py and
+# dashboard.py, or replicas) may share the files, so a flush starts from what is on
+# disk and only lays this process's own changes over it.
+def _replay_user_log(data, log):
+    for line in log.splitlines():
+        try:
+            event = _json_loads(line)
+        except ValueError:
+            continue
+        user = data.get(event.get("u"))
+        if user is not None and event.get("a") not in user["watched"]:
+            user["watched"].append(event["a"])
+    return data
+
+def _read_user_data():
+    # Returns the snapshot with the log replayed over it, plus the log bytes that were replayed
+    data, log = {}, b""
     if os.path.exists(USER_DATA_FILE):
-        with open(USER_DATA_FILE, "r") as f:
-            return json.load(f)
-    return {}
-
-def save_user_data(data):
-    with open(USER_DATA_FILE, "w") as f:
-        json.dump(data, f)
-
-def signup_user(username):  
-    data = load_user_data()
-    if username in data: return False
-    data[username] = {"genres": [], "watched": []}
-    save_user_data(data)
+        with open(USER_DATA_FILE, "rb") as f:
+            data = _json_loads(f.read())
+    if os.path.exists(USER_LOG_FILE):
+        with open(USER_LOG_FILE, "rb") as f:
+            log = f.read()
+    return _replay_user_log(data, log), log
+
+def _trim_user_log(folded):
+    # Drop only the lines that were folded into the snapshot; clicks other processes
+    # appended since then stay for the next flush
+    if not folded or not os.path.exists(USER_LOG_FILE):
+        return
+    with open(USER_LOG_FILE, "rb") as f:
+        log = f.read()
+    if not log.startswith(folded):
+        return  # another process rewrote the log meanwhile; replaying it again is harmless
+    if len(log) == len(folded):
+        os.remove(USER_LOG_FILE)
+    else:
+        with open(USER_LOG_FILE + ".tmp", "wb") as f:
+            f.write(log[len(folded):])
+        os.replace(USER_LOG_FILE + ".tmp", USER_LOG_FILE)
+
+@st.cache_resource
+def _user_cache():
+    cache = {"data": _read_user_data()[0], "dirty": os.path.exists(USER_LOG_FILE),
+             "changed": set(), "lock": threading.RLock(), "timer": None}
+    # Writes still buffered when the server shuts down are flushed on the way out
+    atexit.register(_flush_cache, cache)
+    return cache
+
+def _flush_cache(cache, reload=False):
+    # Runs on script threads and on the timer thread, so it only touches the cache it is given.
+    # reload=True also picks up what other processes wrote when nothing is pending here.
+    with cache["lock"]:
+        if cache["timer"] is not None:
+            cache["timer"].cancel()
+            cache["timer"] = None
+        if not (cache["dirty"] or reload):
+            return
+        # The disk copy already has every logged click, this process's included; users this
+        # process rewrote (signup, genres) win, keeping any clicks another process logged for them
+        data, folded = _read_user_data()
+        for name in cache["changed"]:
+            user = cache["data"][name]
+            watched = data.get(name, {}).get("watched", [])
+            data[name] = dict(user, watched=list(dict.fromkeys(user["watched"] + watched)))
+        if cache["dirty"]:
+            tmp = USER_DATA_FILE + ".tmp"
+            with open(tmp, "wb") as f:
+                f.write(_json_dumps(data))
+            os.replace(tmp, USER_DATA_FILE)
+            _trim_user_log(folded)
+            cache["changed"].clear()
+            cache["dirty"] = False
+        cache["data"] = data
+
+def _schedule_flush(cache):
+    with cache["lock"]:
+        if cache["timer"] is None:
+            cache["timer"] = threading.Timer(USER_FLUSH_DELAY, _flush_cache, args=(cache,))
+            cache["timer"].daemon = True
+            cache["timer"].start()
+
+def load_user_data():
+    return _user_cache()["data"]
+
+def save_user_data(data, changed=None):
+    # changed: the usernames this write touches (default: every user in data)
+    cache = _user_cache()
+    with cache["lock"]:
+        cache["data"], cache["dirty"] = data, True
+        cache["changed"].update(data if changed is None else changed)
+        _flush_cache(cache)
+
+def flush_user_data():
+    _flush_cache(_user_cache())
+
+def append_watched_event(username, title):
+    with open(USER_LOG_FILE, "ab") as f:
+        f.write(_json_dumps({"u": username, "a": title, "ts": time.time()}) + b"\n")
+    if os.path.getsize(USER_LOG_FILE) > USER_LOG_MAX_BYTES:
+        flush_user_data()
+
+def signup_user(username):
+    cache = _user_cache()
+    with cache["lock"]:
+        _flush_cache(cache, reload=True)  # a user signed up through another process counts too
+        data = load_user_data()
+        if username in data: return False
+        data[username] = {"genres": [], "watched": []}
+        save_user_data(data, [username])
     return True
 
 def load_user(username):
-    return load_user_data().get(username)
+    _flush_cache(_user_cache(), reload=True)
+    user = load_user_data().get(username)
+    return copy.deepcopy(user) if user else None
 
 def update_user_genres(username, genres):
-    data = load_user_data()
-    if username in data:
-        data[username]['genres'] = genres
-        save_user_data(data)
+    with _user_cache()["lock"]:
+        data = load_user_data()
+        if username in data:
+            data[username]['genres'] = list(genres)
+            save_user_data(data, [username])
 
 def update_watched(username, watched_list):
-    data = load_user_data()
-    if username in data:
-        data[username]['watched'] = watched_list
-        save_user_data(data)
+    cache = _user_cache()
+    # The lock keeps the timer thread from serialising the dict mid-update
+    with cache["lock"]:
+        data = cache["data"]
+        if username in data and watched_list:
+            data[username]['watched'] = list(watched_list)
+            cache["dirty"] = True
+            append_watched_event(username, watched_list[-1])
+            _schedule_flush(cache)
 
 # ===== Load Model/Data =====
+def load_similarity(pkl_path="cosine_similarity.pkl", npy_path="cosine_similarity.npy"):
+    # The .npy is derived from the pickle; rebuild it whenever the pickle is newer (e.g. the
+    # notebook regenerated it) so a stale matrix is never served
+    if os.path.exists(pkl_path) and (not os.path.exists(npy_path)
+                                     or os.path.getmtime(pkl_path) > os.path.getmtime(npy_path)):
+        cosine_sim = np.ascontiguousarray(joblib.load(pkl_path), dtype=np.float32)
+        try:
+            with open(npy_path + ".tmp", "wb") as f:
+                np.save(f, cosine_sim)
+            os.replace(npy_path + ".tmp", npy_path)
+        except OSError:  # read-only checkout: serve the fresh matrix from memory instead
+            return cosine_sim
+    return np.load(npy_path, mmap_mode="r")
+
 @st.cache_resource
 def load_model():
     df = joblib.load("movies_df.pkl")
-    cosine_sim = joblib.load("cosine_similarity.pkl")
-    indices = joblib.load("title_indices.pkl")
-    return df, cosine_sim, indices
-
-df, cosine_sim, indices = load_model()
+    df['_genre_lc'] = df['Genre'].str.lower()
+    df['_title_lc'] = df['Series_Title'].str.lower()
+    # Categorical titles: remaining isin filters compare integer codes, not strings
+    df['Series_Title'] = df['Series_Title'].astype('category')
+    # Memory-mapped float32 matrix: only the rows a recommendation touches get paged in
+    cosine_sim = load_similarity()
+    # title -> row Series; duplicate titles such as "Drishyam" appear once per row
+    indices = joblib.load("title_indices.pkl").astype(np.intp)
+    # Per-row 1/(rows sharing the title) so duplicate titles contribute their mean
+    title_share = (1.0 / indices.index.map(indices.index.value_counts()).to_numpy()).astype(np.float32)
+
+    # Boolean genre matrix (n_movies x n_genres) so genre scoring is a column sum
+    genre_lists = df['Genre'].str.split(', ')
+    all_genres = sorted({g for lst in genre_lists for g in lst})
+    genre_idx = {g: i for i, g in enumerate(all_genres)}
+    G = np.zeros((len(df), len(all_genres)), dtype=bool)
+    for i, lst in enumerate(genre_lists):
+        G[i, [genre_idx[g] for g in lst]] = True
+
+    # The same membership bit-packed into uint64 words (64 genres per word) for "any of" queries
+    genre_bits = np.zeros((len(df), -(-len(all_genres) // 64)), dtype=np.uint64)
+    for w in range(genre_bits.shape[1]):
+        block = G[:, w * 64:(w + 1) * 64].astype(np.uint64)
+        genre_bits[:, w] = (block << np.arange(block.shape[1], dtype=np.uint64)).sum(axis=1)
+    return df, cosine_sim, indices, title_share, G, genre_idx, genre_bits
+
+df, cosine_sim, indices, title_share, G, genre_idx, genre_bits = load_model()
+all_genres = list(genre_idx)  # sorted; built once in load_model()
 
 # ===== Recommendation Logic =====
-def recommend_for_user(preferred_genres, watched_titles, top_n=10):
-    scores = np.zeros(len(df))
-    if len(watched_titles) >= 3: genre_weight, watch_weight = 0.3, 4.0
-    elif watched_titles: genre_weight, watch_weight = 0.5, 3.5
-    else: genre_weight, watch_weight = 2.0, 0.0
+def watched_rows_for(titles):
+    # One vectorised lookup for the whole list; -1 marks titles missing from the catalogue
+    pos = indices.index.get_indexer_non_unique(list(titles))[0]
+    return indices.to_numpy()[pos[pos >= 0]]
 
-    for genre in preferred_genres:
-        scores[df['Genre'].str.contains(genre, case=False, na=False)] += genre_weight
+def genre_mask(genre_cols):
+    qmask = np.zeros(genre_bits.shape[1], dtype=np.uint64)
+    for col in genre_cols:
+        qmask[col // 64] |= np.uint64(1) << np.uint64(col % 64)
+    return qmask
 
-    for title in watched_titles:
-        if title in indices:
-            idx = indices[title]
-            sim_vec = cosine_sim[idx].mean(axis=0) if isinstance(idx,(pd.Series,list,np.ndarray)) else cosine_sim[idx]
-            scores += watch_weight * sim_vec
+def has_any_genre(rows, qmask):
+    return ((genre_bits[rows] & qmask) != 0).any(axis=1)
 
-    watched_idx = []
-    for t in watched_titles:
-        if t in indices:
-            idx_val = indices[t]
-            watched_idx.extend(idx_val if isinstance(idx_val,(pd.Series,list,np.ndarray)) else [idx_val])
+REC_COLUMNS = ['Series_Title', 'Genre', 'IMDB_Rating', 'Certificate', 'Released_Year']
 
-    scores[watched_idx] = -1
-    rec_df = df.iloc[np.argsort(scores)[::-1]]
-    rec_df = rec_df[~rec_df['Series_Title'].isin(watched_titles)]
-
-    if preferred_genres:
-        signup_df = rec_df[rec_df['Genre'].str.contains('|'.join(preferred_genres), case=False, na=False)]
-    else:
-        signup_df = rec_df.head(0)
+def recommend_for_user(preferred_genres, watched_titles, top_n=10):
+    scores = np.zeros(len(df), dtype=np.float32)
+    if len(watched_titles) >= 3: genre_weight, watch_weight = 0.3, 4.0
+    elif watched_titles: genre_weight, watch_weight = 0.5, 3.5
+    else: genre_weight, watch_weight = 2.0, 0.0
 
-    rec_df = pd.concat([signup_df.head(3), rec_df]).drop_duplicates()
-    return rec_df.head(top_n)[['Series_Title','Genre','IMDB_Rating','Certificate','Released_Year']]
+    genre_cols = [genre_idx[g] for g in preferred_genres if g in genre_idx]
+    watched_rows = watched_rows_for(watched_titles)
+
+    if genre_cols:
+        # One matrix-vector product over the genre matrix; a genre listed twice still counts once
+        pref_vec = np.zeros(G.shape[1], dtype=np.float32)
+        pref_vec[genre_cols] = genre_weight
+        scores += G @ pref_vec
+    # One gather + matrix-vector product; duplicate titles are averaged via title_share
+    if watched_rows.size:
+        scores += watch_weight * (title_share[watched_rows] @ np.take(cosine_sim, watched_rows, axis=0))
+    scores[watched_rows] = -1
+    # Partial selection of the best candidates for the main list
+    k = min(max(top_n, 1) * 4, len(scores))
+    cand = np.argpartition(-scores, k - 1)[:k]
+    rec_idx = cand[np.argsort(-scores[cand], kind="stable")]
+    rec_idx = rec_idx[~np.isin(rec_idx, watched_rows)]
+
+    # Up to 3 signup-genre matches go first, drawn from the whole catalogue (not just the
+    # candidates above) via the packed genre bits
+    pool = np.flatnonzero(has_any_genre(slice(None), genre_mask(genre_cols)))
+    pool = pool[~np.isin(pool, watched_rows)]
+    if pool.size > 3:
+        # Partition for the 3rd best score; keep everything tied with it so the stable sort decides
+        third = -np.partition(-scores[pool], 2)[2]
+        pool = pool[scores[pool] >= third]
+    signup_idx = pool[np.argsort(-scores[pool], kind="stable")][:3]
+    rec_idx = pd.unique(np.concatenate([signup_idx, rec_idx]))
+    # Gather only the card columns for the final rows, not every column and then a subset
+    return df.iloc[rec_idx[:top_n], df.columns.get_indexer(REC_COLUMNS)]
+
+# Streamlit reruns the script on every interaction; df/cosine_sim/indices are
+# immutable, so results only depend on (genres, watched, top_n)
+@st.cache_data(ttl=300, max_entries=64, show_spinner=False)
+def _cached_recommend(preferred_genres_key, watched_key, top_n):
+    return recommend_for_user(list(preferred_genres_key), list(watched_key), top_n)
+
+@st.cache_data(ttl=300, max_entries=64, show_spinner=False)
+def _cached_reason_map(preferred_genres_key, watched_key, top_n):
+    recs = _cached_recommend(preferred_genres_key, watched_key, top_n)
+    reason_map = {}
+    # Similarity of every watched row to every recommendation in one slice
+    watched_rows = watched_rows_for(watched_key)
+    row_titles = df['Series_Title'].to_numpy()[watched_rows]
+    sim = cosine_sim[np.ix_(watched_rows, recs.index.to_numpy())]
+    threshold = 0.1
+    # Rows beyond the distinct titles (duplicate titles); selecting this many extra still yields 3 titles
+    spare = len(watched_rows) - len(set(row_titles))
+    # Exact genre membership from the genre matrix ("Music" no longer matches "Musical")
+    pref_cols = [(g, genre_idx[g]) for g in preferred_genres_key if g in genre_idx]
+    # Only the label and title are needed, so zip the two columns instead of boxing rows with iterrows()
+    for j, (idx, title) in enumerate(zip(recs.index, recs['Series_Title'])):
+        reasons = []
+        # The 3 most similar watched titles: partition the hits, then sort only the few selected
+        sims = sim[:, j]
+        hits = np.flatnonzero(sims > threshold)
+        k = min(hits.size, 3 + spare)
+        if k < hits.size:
+            hits = hits[np.argpartition(-sims[hits], k - 1)[:k]]
+        hits = hits[np.argsort(-sims[hits], kind="stable")]
+        watched_reasons = list(dict.fromkeys(row_titles[hits]))[:3]
+        if watched_reasons:
+            reasons.append("You watched " + ", ".join(watched_reasons))
+        genre_matches = [g for g, col in pref_cols if G[idx, col]][:3]
+        if genre_matches:
+            reasons.append("You selected genre(s) " + ", ".join(genre_matches))
+        reason_map[title] = " and ".join(reasons) if reasons else None
+    return reason_map
+
+def recommendations_for_session(top_n=10):
+    # Scores are a sum over watched titles, so their order doesn't matter: sort them so every
+    # ordering of the same watched set shares one cache entry. Genres keep the user's order,
+    # which is the order the reasons list them in.
+    key = (tuple(st.session_state.genres), tuple(sorted(st.session_state.watched)), top_n)
+    return _cached_recommend(*key), _cached_reason_map(*key)
 
 # ===== Emoji Mapping =====
 genre_emojis = {
@@ -93,17 +312,24 @@ genre_emojis = {
     "documentary":"🎥","crime":"🕵️","mystery":"🕵️","war":"⚔️","musical":"🎶","music":"🎶"
 }
 
-def get_dominant_genre_with_emoji(genre_string, signup_genres=None):
-    genres_list = [g.strip() for g in str(genre_string).split(",")]
-    if signup_genres:
-        for sg in signup_genres:
-            for g in genres_list:
-                if sg.lower() in g.lower():
-                    return genre_emojis.get(g.lower(),"🎞️"), genre_string
-    for g in genres_list:
-        if g.lower() in genre_emojis:
-            return genre_emojis[g.lower()], genre_string
-    return "🎞️", genre_string
+@st.cache_resource
+def default_genre_emojis():
+    # Per row: emoji of the first listed genre that has one, computed once instead of per card
+    return [next((genre_emojis[g] for g in s.lower().split(", ") if g in genre_emojis), "🎞️")
+            for s in df['Genre']]
+
+dominant_emoji = default_genre_emojis()
+
+def signup_genre_emojis(signup_genres):
+    # (genre column, emoji) per signup genre, resolved once per grid rather than per card
+    return [(genre_idx[g], genre_emojis.get(g.lower(), "🎞️")) for g in signup_genres or () if g in genre_idx]
+
+def get_dominant_genre_emoji(row_pos, signup_emojis=()):
+    # The first signup genre the movie has wins; membership is one lookup in the genre matrix
+    for col, emoji in signup_emojis:
+        if G[row_pos, col]:
+            return emoji
+    return dominant_emoji[row_pos]
 
 # ===== Inject CSS =====
 st.markdown("""
@@ -138,6 +364,41 @@ div[data-testid="stButton"] > button[kind="primary"]:hover{
 </style>
 """, unsafe_allow_html=True)
 
+# ===== Card CSS (once per page) =====
+def inject_card_css(dark):
+    bg_color = "#23272e" if dark else "#fdfdfe"
+    text_color = "#f5f5f5" if dark else "#222"
+    border_color = "#3d434d" if dark else "#e2e3e6"
+    genre_color = "#b2b2b2" if dark else "#5A5A5A"
+    st.markdown(f"""
+<style>
+.movie-card {{
+    border:1.5px solid {border_color};
+    border-radius:10px;
+    padding:12px;
+    background:{bg_color};
+    color:{text_color};
+    box-shadow:0 2px 6px rgba(0,0,0,0.08);
+    min-height:180px;
+    height:auto;
+    justify-content:space-between;
+    overflow-wrap:break-word;
+    word-break:break-word;
+    white-space:normal;
+}}
+.movie-title {{ font-weight:700; font-size:1.1rem; line-height:1.3; }}
+.movie-cert {{
+    display:inline-block;color:#fff;padding:4px 10px;border-radius:6px;
+    font-size:0.85rem;font-weight:bold;min-width:38px;text-align:center;margin-top:6px;
+}}
+.movie-genre {{ color:{genre_color}; margin-top:6px; }}
+.movie-rating {{ color:#fcb900; margin-top:6px; }}
+.movie-reason {{ margin-top:8px; color:#399ed7; font-size:0.9rem; }}
+.movie-row {{ display:flex; gap:1rem; margin-bottom:0.5rem; }}
+.movie-row > div {{ flex:1 1 0; min-width:0; }}
+</style>
+""", unsafe_allow_html=True)
+
 # ===== Reason formatter =====
 def format_reason(reason: str) -> str:
     if not reason:
@@ -162,7 +423,7 @@ def format_reason(reason: str) -> str:
     if not watched_movies and not genres:
         return ""
 
-    parts = ["<div style='margin-top:8px;color:#399ed7;font-size:0.9rem;'>💡 Why recommended:<br>"]
+    parts = ["<div class='movie-reason'>💡 Why recommended:<br>"]
     if watched_movies:
         parts.append("🎬 You Watched :<br>")
         for m in watched_movies:
@@ -175,15 +436,8 @@ def format_reason(reason: str) -> str:
     return "".join(parts)
 
 # ===== Card Renderer with Details =====
-def movie_card(row, watched_list, username, section, reason=None, show_button=True, signup_genres=None):
-    dark = st.session_state.get('dark_mode', False)
-    bg_color = "#23272e" if dark else "#fdfdfe"
-    text_color = "#f5f5f5" if dark else "#222"
-    border_color = "#3d434d" if dark else "#e2e3e6"
-    genre_color = "#b2b2b2" if dark else "#5A5A5A"
-    rating_color = "#fcb900"
-
-    emoji, genre_text = get_dominant_genre_with_emoji(row["Genre"], signup_genres)
+def movie_card_html(row, row_name, reason=None, signup_emojis=()):
+    emoji = get_dominant_genre_emoji(row_name, signup_emojis)
 
     cert_value = row["Certificate"] if pd.notna(row["Certificate"]) and str(row["Certificate"]).strip() else "UA"
     cert_value = cert_value.strip()
@@ -192,57 +446,38 @@ def movie_card(row, watched_list, username, section, reason=None, show_button=Tr
 
     reason_html = format_reason(reason) if reason else ""
 
-    html = textwrap.dedent(f"""<div class="movie-card" style="border:1.5px solid {border_color};
-border-radius:10px;padding:12px;background:{bg_color};color:{text_color};
-box-shadow:0 2px 6px rgba(0,0,0,0.08);min-height:180px;height:auto;
-display:flex;flex-direction:column;justify-content:space-between;
-overflow-wrap:break-word;word-break:break-word;white-space:normal;">
-
+    # Static styling lives in inject_card_css(); only per-card values are inlined
+    return textwrap.dedent(f"""<div class="movie-card">
 <div>
-  <div style="font-weight:700;font-size:1.1rem;line-height:1.3;">
-    {row["Series_Title"]} ({row["Released_Year"]})
-  </div>
-  <div style="display:inline-block;background:{cert_color};color:#fff;padding:4px 10px;border-radius:6px;
-              font-size:0.85rem;font-weight:bold;min-width:38px;text-align:center;margin-top:6px;">
-    {cert_value}
-  </div>
+  <div class="movie-title">{row["Series_Title"]} ({row["Released_Year"]})</div>
+  <div class="movie-cert" style="background:{cert_color};">{cert_value}</div>
 </div>
-
 <div>
-  <div style="color:{genre_color};margin-top:6px;">
-    {emoji} <span style="font-style: italic;">{genre_text}</span>
-  </div>
-  <div style="color:{rating_color};margin-top:6px;">
-    ⭐ {row["IMDB_Rating"]:.1f}/10
-  </div>
+  <div class="movie-genre">{emoji} <span style="font-style: italic;">{row["Genre"]}</span></div>
+  <div class="movie-rating">⭐ {row["IMDB_Rating"]:.1f}/10</div>
   {reason_html}
 </div>
-
 </div>""")
-    st.markdown(html, unsafe_allow_html=True)
-
-    _details = df.loc[df['Series_Title'] == row['Series_Title']]
-    if not _details.empty:
-        d = _details.iloc[0]
-        overview = d['Overview'] if pd.notna(d.get('Overview')) else "Not available."
-        runtime = str(d['Runtime']).strip() if pd.notna(d.get('Runtime')) else "N/A"
-        if runtime != "N/A" and "min" not in runtime.lower():
-            runtime = runtime + " min"
-        stars = [d.get('Star1'), d.get('Star2'), d.get('Star3'), d.get('Star4')]
-        stars = [s for s in stars if pd.notna(s) and str(s).strip()]
-    else:
-        overview, runtime, stars = "Not available.", "N/A", []
 
+def movie_card_actions(row, row_name, watched_list, username, section, show_button=True):
+    # row_name is the df index label, so details are a direct lookup rather than a title scan
+    d = df.loc[row_name]
+    overview = d['Overview'] if pd.notna(d.get('Overview')) else "Not available."
+    runtime = str(d['Runtime']).strip() if pd.notna(d.get('Runtime')) else "N/A"
+    if runtime != "N/A" and "min" not in runtime.lower():
+        runtime = runtime + " min"
+    stars = [d.get('Star1'), d.get('Star2'), d.get('Star3'), d.get('Star4')]
+    stars = [s for s in stars if pd.notna(s) and str(s).strip()]
+
+    # One markdown element for the whole details panel
+    details = [f"**Overview:** {overview}", f"**Runtime:** {runtime}"]
+    if stars:
+        details.append("**Stars:**\n\n" + "\n".join(f"- {s}" for s in stars))
     with st.expander("🔎 View details", expanded=False):
-        st.markdown(f"**Overview:** {overview}")
-        st.markdown(f"**Runtime:** {runtime}")
-        if stars:
-            st.markdown("**Stars:**")
-            for s in stars:
-                st.markdown(f"- {s}")
+        st.markdown("\n\n".join(details))
 
     if show_button:
-        key = f"watched_{section}_{row.name}"
+        key = f"watched_{section}_{row_name}"
         if row['Series_Title'] not in watched_list:
             if st.button("▶ Watch Now", key=key, type="primary", use_container_width=True):
                 watched_list.append(row['Series_Title'])
@@ -254,15 +489,22 @@ overflow-wrap:break-word;word-break:break-word;white-space:normal;">
 # ===== Render Cards Grid =====
 def render_cards(dataframe, watched_list, username, section, show_button=True, reason_map=None, signup_genres=None):
     cols_per_row = 3
-    for r in range(ceil(len(dataframe) / cols_per_row)):
+    # Plain dicts are much cheaper to read per card than a fresh Series from .iloc
+    records = dataframe.to_dict('records')
+    row_names = dataframe.index.tolist()
+    signup_emojis = signup_genre_emojis(signup_genres)
+    for start in range(0, len(records), cols_per_row):
+        batch = range(start, min(start + cols_per_row, len(records)))
+        # The whole row of cards is one markdown element; empty divs keep a short row aligned with the columns
+        cards = [movie_card_html(records[i], row_names[i], reason_map.get(records[i]['Series_Title']) if reason_map else None, signup_emojis)
+                 for i in batch]
+        cards += ["<div></div>"] * (cols_per_row - len(cards))
+        st.markdown(f"<div class='movie-row'>{''.join(cards)}</div>", unsafe_allow_html=True)
+        # Widgets cannot live inside raw HTML, so details and buttons go in matching columns below
         cols = st.columns(cols_per_row)
-        for c in range(cols_per_row):
-            idx = r*cols_per_row + c
-            if idx < len(dataframe):
-                row = dataframe.iloc[idx]
-                reason = reason_map.get(row['Series_Title']) if reason_map else None
-                with cols[c]:
-                    movie_card(row, watched_list, username, section, reason, show_button, signup_genres)
+        for c, i in enumerate(batch):
+            with cols[c]:
+                movie_card_actions(records[i], row_names[i], watched_list, username, section, show_button)
 
 # ===== Login/Signup Page =====
 def login_signup_page():
@@ -301,7 +543,6 @@ def login_signup_page():
 def genre_selection_page():
     st.title(f"Welcome, {st.session_state.username}!")
     st.subheader("Select Your Favourite Genres")
-    all_genres = sorted(set(g for glist in df['Genre'].str.split(', ') for g in glist))
     if "temp_selected_genres" not in st.session_state:
         st.session_state.temp_selected_genres = []
     cols_per_row = 4
@@ -331,29 +572,41 @@ def genre_selection_page():
                 st.error("Please select at least one genre to continue.")
 
 # ===== Search helpers =====
+def search_mask(rows, searchterm):
+    # Plain substring match against the lowercase columns built once in load_model()
+    term = str(searchterm).lower()
+    return (rows["_title_lc"].str.contains(term, regex=False, na=False) |
+            rows["_genre_lc"].str.contains(term, regex=False, na=False)).to_numpy()
+
 def search_top_movies(searchterm: str):
     if not searchterm:
         return df.sort_values(by="IMDB_Rating", ascending=False)["Series_Title"].head(10).tolist()
-    results = df[df["Series_Title"].str.lower().str.contains(str(searchterm).lower()) |
-                 df["Genre"].str.lower().str.contains(str(searchterm).lower())]
+    results = df[search_mask(df, searchterm)]
     return results["Series_Title"].head(10).tolist()
 
 def search_watched_movies(searchterm: str):
-    watched_df = df[df['Series_Title'].isin(st.session_state.watched)]
+    watched_df = df.iloc[watched_rows_for(st.session_state.watched)]  # in the order they were watched
     if not searchterm:
         return watched_df["Series_Title"].tolist()
-    results = watched_df[watched_df["Series_Title"].str.lower().str.contains(str(searchterm).lower()) |
-                         watched_df["Genre"].str.lower().str.contains(str(searchterm).lower())]
+    results = watched_df[search_mask(watched_df, searchterm)]
     return results["Series_Title"].head(10).tolist()
 
 def search_recommended_movies(searchterm: str):
-    recs = recommend_for_user(st.session_state.genres, st.session_state.watched, 10)
+    recs, _ = recommendations_for_session(10)
     if not searchterm:
         return recs["Series_Title"].tolist()
-    results = recs[recs["Series_Title"].str.lower().str.contains(str(searchterm).lower()) |
-                   recs["Genre"].str.lower().str.contains(str(searchterm).lower())]
+    results = recs[search_mask(df.loc[recs.index], searchterm)]
     return results["Series_Title"].head(10).tolist()
 
+# ===== Top Rated helper =====
+# Independent of the user, so it is computed once per process and shared by every session
+@st.cache_data
+def top_rated_pool():
+    # Top 3 rated movies per genre, walking one rating-sorted order through the genre bits
+    order = np.argsort(-df['IMDB_Rating'].to_numpy(), kind="stable")
+    picks = [order[has_any_genre(order, genre_mask([col]))][:3] for col in range(G.shape[1])]
+    return df.iloc[np.concatenate(picks)].drop_duplicates("Series_Title")
+
 # ===== Greeting helper =====
 def get_greeting():
     hour = datetime.now().hour
@@ -373,7 +626,9 @@ def dashboard_page():
         st.session_state.scroll_to_top = False
     if st.sidebar.button("🌙 Dark Mode"):
         st.session_state.dark_mode = not st.session_state.dark_mode
+    inject_card_css(st.session_state.dark_mode)
     if st.sidebar.button("🚪 Logout"):
+        flush_user_data()
         st.session_state.page = "login_signup"
         st.session_state.username = ""
         st.session_state.genres = []
@@ -399,11 +654,7 @@ def dashboard_page():
        
 
     with tab1:
-        top_movies = df.sort_values(by="IMDB_Rating", ascending=False)
-        mixed_df = pd.concat([
-            top_movies[top_movies['Genre'].str.contains(g, case=False, na=False)].head(3)
-            for g in set(g for lst in df['Genre'].str.split(', ') for g in lst)
-        ]).drop_duplicates("Series_Title")
+        mixed_df = top_rated_pool()
         mixed_df = mixed_df[~mixed_df['Series_Title'].isin(st.session_state.watched)].head(50)
         selected_title = st_searchbox(search_top_movies, placeholder="Search top movies...", key="top_searchbox")
         if selected_title:
@@ -413,7 +664,7 @@ def dashboard_page():
    
 
     with tab2:
-        watched_df = df[df['Series_Title'].isin(st.session_state.watched)]
+        watched_df = df.iloc[watched_rows_for(st.session_state.watched)]  # in the order they were watched
         if watched_df.empty:
             st.info("You haven’t watched anything yet!")
         else:
@@ -423,20 +674,7 @@ def dashboard_page():
             render_cards(watched_df, st.session_state.watched, st.session_state.username, "your", False, signup_genres=st.session_state.genres)
 
     with tab3:
-        recs = recommend_for_user(st.session_state.genres, st.session_state.watched, 10)
-        reason_map = {}
-        for idx, row in recs.iterrows():
-            reasons = []
-            watched_reasons = [
-                w for w in st.session_state.watched
-                if w in indices and cosine_sim[indices[w]][idx] > 0.1
-            ]
-            if watched_reasons:
-                reasons.append("You watched " + ", ".join(watched_reasons[:3]))
-            genre_matches = [g for g in st.session_state.genres if g.lower() in row["Genre"].lower()][:3]
-            if genre_matches:
-                reasons.append("You selected genre(s) " + ", ".join(genre_matches))
-            reason_map[row['Series_Title']] = " and ".join(reasons) if reasons else None
+        recs, reason_map = recommendations_for_session(10)
         selected_title = st_searchbox(search_recommended_movies, placeholder="Search recommended movies...", key="rec_searchbox")
         if selected_title:
             recs = recs[recs['Series_Title'] == selected_title]
@@ -0,0 +1,8 @@
+# One-time conversion of cosine_similarity.pkl into a raw float32 .npy that the
+# apps memory-map at startup. Re-run after regenerating the pickle in the notebook;
+# the apps also rebuild it themselves when they find the pickle is newer.
+import joblib
+import numpy as np
+
+cosine_sim = joblib.load("cosine_similarity.pkl")
+np.save("cosine_similarity.npy", np.ascontiguousarray(cosine_sim, dtype=np.float32))